@@ -38,6 +38,7 @@ from .base import (
 from .sprite import keyfr, keyframes, keyrange
 from .sprite import GPUAniSprite as Sprite
 from .tilemap import (
-        load_tmx, load_tilemap_string, load_tileset, render_tilemap, Tilemap )
+        load_tmx, load_tilemap_string, load_tileset, render_tilemap, Tilemap,
+        enable_batching )
 from .tfont import TextureFont, NinePatch, round_patch
 from .menu import Menu
@@ -176,7 +176,7 @@ def sprites():
 
 
 def tilemap():
-	from .tilemap import load_tilemap_string, load_tileset, render_tilemap, tile_background, Tilemap, scale_tilemap
+	from .tilemap import load_tilemap_string, load_tileset, render_tilemap, tile_background, Tilemap
 	pg.init()
 	window = Window('Testing', (1600,900))
 	renderer = Renderer(window)
@@ -243,7 +243,10 @@ def tilemap():
 
 		camera[2] = scale
 		
-		scale_tilemap(tilemap, camera, scale, center=False, clamp=True, background=background)
+		# the example camera is in screen pixels, render_tilemap expects
+		# world coordinates and scales them itself
+		render_tilemap(tilemap, (camera.x / scale, camera.y / scale, scale),
+				background=background)
 		#group.update(delta)
 		#group.draw()
 		tfont.draw('Click and drag to scroll, wheel to zoom', 10, 10)
@@ -23,12 +23,45 @@ License along with renderpyg.
 If not, see <http://www.gnu.org/licenses/>.
 '''
 import os, sys, random, math
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
 import pygame as pg
 import pygame.gfxdraw
 from pygame._sdl2 import Window, Renderer, Texture, Image
 from .base import load_texture
 
 char_map = ''' ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,?!-:'"_=+<>~@/\\|(%)'''
+
+
+def _pack_glyphs(sizes, max_width=1024):
+	'''
+	Pack glyph boxes into shelves no wider than max_width, widest first,
+	placing each box on the first shelf with room for it
+
+	:param sizes: list of (width, height) tuples for each glyph
+	:param max_width: maximum width of the atlas
+	:rvalue: list of (x, y) positions in the order of sizes, (width, height)
+		of the packed atlas
+	'''
+	shelves = [] # [y, height, used width] for each shelf
+	positions = [None] * len(sizes)
+	order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+	height = 0
+	for i in order:
+		w, h = sizes[i]
+		for shelf in shelves:
+			if h <= shelf[1] and shelf[2] + w <= max_width:
+				break
+		else:
+			shelf = [height, h, 0]
+			shelves.append(shelf)
+			height += h + 1 # keep a pixel between rows to avoid bleeding
+		positions[i] = shelf[2], shelf[0]
+		shelf[2] += w
+	width = max((shelf[2] for shelf in shelves), default=0)
+	return positions, (width, height)
+
 class TextureFont():
 	'''
 	Font renderer for use with pygame._sdl2
@@ -43,6 +76,9 @@ class TextureFont():
 		'''
 		self.renderer = renderer
 		self.filename = filename
+		self._prerendered = OrderedDict()
+		self._text_widths = {}
+		self._state = [None, None] # color and alpha last set on the texture
 
 		'''
 		Allow multi fonts in one texture using TextureFont.multi_font()
@@ -51,42 +87,60 @@ class TextureFont():
 			self.cmap = shared
 			self.height = size
 			self.blank = shared[' ']
+			self._build_tables()
 			return
 
 		font = pg.font.Font(filename, size)
 		self.cmap = {}
-		tot = 0
 
-		for c in char_map:
-			tot += font.size(c)[0]
-		if tot > 1024: # prevent overly wide textures
-			width = 1024
-			rows = int(tot // 1024) + 1
-		else:
-			width = tot
-			rows = 1
+		# render each glyph once and pack the results into the atlas
 		self.height = font.get_height()
-
-		if shared:
-			surface, texture, y = shared
-		else:
-			y = 0
-			surface = pg.surface.Surface((width, font.get_height() * rows + rows), flags=pg.SRCALPHA)
-
-		tot = x = 0
-		for c in char_map:
-			rend = font.render(c, 1, (255,255,255))
-			wi = rend.get_width()
-			if x + wi > 1024: # limit texture width
-				x = 0
-				y += self.height+1
-			surface.blit(rend, (x, y))
-			self.cmap[c] = pg.Rect(x, y, wi, self.height)
-			tot += wi
-			x += wi
+		glyphs = [(c, font.render(c, 1, (255,255,255))) for c in char_map]
+		positions, size = _pack_glyphs(
+				[(rend.get_width(), self.height) for c, rend in glyphs])
+		surface = pg.surface.Surface(size, flags=pg.SRCALPHA)
+
+		surface.blits([(rend, pos) for (c, rend), pos in zip(glyphs, positions)],
+				doreturn=False)
+		for (c, rend), (x, y) in zip(glyphs, positions):
+			self.cmap[c] = pg.Rect(x, y, rend.get_width(), self.height)
 		self.blank = self.cmap[' ']
+		self._build_tables()
 		self.texture = Texture.from_surface(renderer, surface)
 
+	def _build_tables(self):
+		'''
+		Build flat latin-1 lookup tables from cmap so glyph rects and widths
+		can be indexed by character code instead of hashed per character
+		'''
+		self._glyphs = [self.blank] * 256
+		self._widths = array('H', [self.blank.width]) * 256
+		for c, rect in self.cmap.items():
+			if ord(c) < 256:
+				self._glyphs[ord(c)] = rect
+				self._widths[ord(c)] = rect.width
+
+	def _set_state(self, color, alpha):
+		'''
+		Set the texture color and alpha, skipping the setters when the
+		texture already holds those values from an earlier draw
+		'''
+		state = self._state
+		if state[0] != color:
+			self.texture.color = state[0] = color
+		if state[1] != alpha:
+			self.texture.alpha = state[1] = alpha
+
+	def _glyph_rects(self, text):
+		'''
+		Return the list of texture rects used to draw each character
+		'''
+		try:
+			return list(map(self._glyphs.__getitem__, text.encode('latin-1')))
+		except UnicodeEncodeError:
+			get, blank = self.cmap.get, self.blank
+			return [get(c, blank) for c in text]
+
 	@staticmethod
 	def multi_font(renderer, fonts):
 		"""
@@ -97,51 +151,41 @@ class TextureFont():
 		:param renderer: pygame._sdl2.video.Renderer to draw on
 		:param fonts: list of (filename, size) tuples for each font
 		"""
+		packed = [] # filename, glyph height, glyphs, positions, top, rows height
 		total_height = 0
-		for filename, size in fonts: # determine height and is within limit
+		for filename, size in fonts: # render and pack each glyph once
 			font = pg.font.Font(filename, size)
 			height = font.get_height()
-
-			tot = 0
-			for c in char_map:
-				w = font.size(c)[0]
-				tot += w
-			rows = int(tot // 1024) + 1
-			total_height += rows * height + rows
+			glyphs = [(c, font.render(c, 1, (255,255,255))) for c in char_map]
+			positions, (w, rows) = _pack_glyphs(
+					[(rend.get_width(), height) for c, rend in glyphs])
+			packed.append((filename, height, glyphs, positions, total_height, rows))
+			total_height += rows
 			if total_height > 1024:
 				raise ValueError(
 					'TextureFont cannot add {} to shared texture: too large'.format(
 						filename))
 
-		y = 0
-		cmap = {}
 		tfonts = []
-		surface = pg.surface.Surface((1024, total_height), flags=pg.SRCALPHA)
-
-		# Generate character maps and TextureFont objects
-		for font, size in fonts:
-			font = pg.font.Font(font, size)
-			height = font.get_height()
-			x = 0
-			tot = 0
-			cmap = {}
-			for c in char_map:
-				rend = font.render(c, 1, (255,255,255))
-				wi = rend.get_width()
-				if x+wi > 1024: # limit texture width
-					x = 0
-					y += height + 1
-				surface.blit(rend, (x, y))
-				cmap[c] = pg.Rect(x, y, wi, height)
-				tot += wi
-				x += wi
-			y += height
-			tfonts.append(TextureFont(filename, font, height, cmap))
-
-		# Create texture and attach it to each font
-		texture = Texture.from_surface(renderer, surface)
+		texture = Texture(renderer, (1024, total_height))
+		texture.blend_mode = 1
+
+		# Generate character maps and TextureFont objects, uploading the
+		# glyphs one font at a time instead of staging the whole atlas
+		for filename, height, glyphs, positions, top, rows in packed:
+			surface = pg.surface.Surface((1024, rows), flags=pg.SRCALPHA)
+			surface.blits([(rend, pos) for (c, rend), pos in zip(glyphs, positions)],
+					doreturn=False)
+			texture.update(surface, (0, top, 1024, rows))
+			cmap = {c: pg.Rect(x, top + y, rend.get_width(), height)
+					for (c, rend), (x, y) in zip(glyphs, positions)}
+			tfonts.append(TextureFont(renderer, filename, height, cmap))
+
+		# Attach the shared texture and its cached state to each font
+		state = [None, None]
 		for font in tfonts:
 			font.texture = texture
+			font._state = state
 		return tfonts
 
 
@@ -159,8 +203,7 @@ class TextureFont():
 		:rvalue rect: actual area drawn into
 		'''
 		dest = pg.Rect(x, y, 1, self.height)
-		self.texture.alpha = alpha or 255
-		self.texture.color = color if color else (255,255,255,0)
+		self._set_state(tuple(color) if color else (255,255,255), alpha or 255)
 		if align == 'right':
 			dest.left -= self.width(text)
 		elif align == 'center':
@@ -171,14 +214,12 @@ class TextureFont():
 			dest.top -= self.height // 2
 
 		x, y = dest.x, dest.top
-		width = 0
-		for c in text:
-			src = self.cmap.get(c, self.blank)
-			dest.width = src.width
-			self.texture.draw(srcrect=src, dstrect=dest)
-			dest.x += src.width
-			width += src.width
-		return pg.Rect(x, y, width, self.height)
+		height = self.height
+		tex_draw = self.texture.draw
+		for src in self._glyph_rects(text): # one texture so SDL can batch
+			tex_draw(srcrect=src, dstrect=(x, y, src.width, height))
+			x += src.width
+		return pg.Rect(dest.x, y, x - dest.x, height)
 
 	def scale(self, text, x, y, scale, color=None, alpha=None, align=False, valign=False):
 		'''
@@ -194,30 +235,27 @@ class TextureFont():
 		:rvalue rect: actual area drawn into
 		'''
 
-		dest = pg.Rect(x, y, 1, self.height*scale)
-		self.texture.alpha = alpha or 255
-		self.texture.color = color if color else (255,255,255)
+		height = self.height * scale
+		dest = pg.Rect(x, y, 1, height)
+		self._set_state(tuple(color) if color else (255,255,255), alpha or 255)
 		if align == 'right':
 			dest.left -= self.width(text, scale)
 		elif align == 'center':
 			dest.left -= self.width(text, scale) // 2
 		if valign == 'bottom':
-			dest.top -= self.height * scale
+			dest.top -= height
 		elif valign == 'center':
-			dest.top -= self.height * scale // 2
-
-		#x, y = dest.x, dest.top
+			dest.top -= height // 2
 
 		width = 0
-		for c in text:
-			src = self.cmap.get(c, self.blank)
-			dest.width = src.width*scale
-			self.texture.draw(srcrect=src, dstrect=dest)
-			#self.texture.renderer.draw_rect(dest)
-			dest.x += src.width*scale
-			width += src.width*scale
-		self.get_rect(text, x, y, scale, center=False)
-		return pg.Rect(x, y, width, self.height*scale)
+		tex_draw = self.texture.draw
+		for src in self._glyph_rects(text):
+			w = src.width * scale
+			dest.width = w
+			tex_draw(srcrect=src, dstrect=dest)
+			dest.x += w
+			width += w
+		return pg.Rect(x, y, width, height)
 
 	def get_rect(self, text, x, y, scale, center=False):
 		'''
@@ -230,17 +268,9 @@ class TextureFont():
 
 		:rvalue rect: actual area drawn into
 		'''
-		dest = pg.Rect(x, y, 1, self.height*scale)
+		width = self.width(text, scale)
 		if center:
-			dest.left -= self.width(text)*scale // 2
-
-		x, y = dest.x, dest.top
-		width = 0
-		for c in text:
-			src = self.cmap.get(c, self.blank)
-			dest.width = src.width*scale
-			dest.x += src.width*scale
-			width += src.width*scale
+			x -= width // 2
 		return pg.Rect(x, y, width, self.height*scale)
 
 	def animate(
@@ -288,52 +318,63 @@ class TextureFont():
 		topleft = x, y
 
 		ticks = pg.time.get_ticks()
-		variance, change = duration * (variance/100), 0
+		variance = duration * (variance/100)
 		zoom = zoom / 100 if zoom else False
 		r, g, b = color
-		self.texture.color = color
-		self.texture.alpha = 255
+		texture, height = self.texture, self.height
+		tex_draw = texture.draw
+		self._set_state(tuple(color), 255)
+		if colors or fade: # changed per glyph below
+			self._state[:] = None, None
 		rx, ry = x, y
-		dest = pg.Rect(x, y, 1, self.height)
-		for i, c in enumerate(text):
-			percent = (ticks - timer + change) % duration / duration
-			amount = 1 - abs(-1 + percent*2)
-
+		dest = pg.Rect(x, y, 1, height)
+		origin = [0.0, 0.0] # reused for every glyph
+		angle = 0
+		sin, cos, tau = math.sin, math.cos, math.pi * 2
+		if colors:
+			_r, _g, _b = colors
+			last_color = None
+
+		# compute the animation phase of every character up front
+		srcs = self._glyph_rects(text)
+		start = ticks - timer
+		percents = [(start + i*variance) % duration / duration
+				for i in range(len(srcs))]
+		amounts = [1 - abs(-1 + percent*2) for percent in percents]
+		for src, percent, amount in zip(srcs, percents, amounts):
 			if rotate:
 				angle =  -rotate + (rotate*2) * amount
-			else:
-				angle = 0
 			if colors:
-				_r, _g, _b = colors
 				color = (
 					int(min(255, r+(_r*amount))),
 					int(min(255, g+(_g*amount))),
 					int(min(255, b+(_b)*amount)) )
-				self.texture.color = color
+				if color != last_color: # state changes break SDL batching
+					texture.color = last_color = color
 			if fade:
-				self.texture.alpha = 255 - amount
+				texture.alpha = 255 - amount
 			
 			if movex or movey:
 				rx = x + (-movex + (movex*2) * amount)
 				ry = y + (-movey + (movey*2) * amount)
 			elif circle:
-				ang = math.radians(360 * percent)
-				rx = x + math.sin(ang) * circle
-				ry = y + math.cos(ang) * circle
+				ang = tau * percent
+				rx = x + sin(ang) * circle
+				ry = y + cos(ang) * circle
 			else:
 				rx = x
 				ry = y
 
-			src = self.cmap.get(c, self.blank)
+			src_w = src.width
 			if zoom:
-				sx = int((zoom * amount) * src.width)
-				sy = int((zoom * amount) * self.height)
-				dest.width = src.width + sx * 2
-				dest.height = self.height + sy * 2
+				sx = int((zoom * amount) * src_w)
+				sy = int((zoom * amount) * height)
+				dest.width = src_w + sx * 2
+				dest.height = height + sy * 2
 				dest.x = rx - sx
 				dest.y = ry - sy
 			else:
-				dest.width = src.width
+				dest.width = src_w
 				dest.height = src.height
 				dest.x = rx
 				dest.y = ry
@@ -341,12 +382,50 @@ class TextureFont():
 			dest.width *= scale
 			dest.height *= scale
 
-			origin = dest.width/2, dest.height/2
-			self.texture.draw(
-				srcrect=src, dstrect=dest, origin=origin, angle=angle)
-			x += src.width * scale
-			change += variance
-		return pg.Rect(topleft[0], topleft[1], x, self.height*scale)
+			origin[0] = dest.width * 0.5
+			origin[1] = dest.height * 0.5
+			tex_draw(srcrect=src, dstrect=dest, origin=origin, angle=angle)
+			x += src_w * scale
+		return pg.Rect(topleft[0], topleft[1], x, height*scale)
+
+	def prerender(self, text, color=None, scale=1):
+		'''
+		Render text once into its own texture so it can be drawn with a
+		single call each frame. The most recently used results are cached,
+		so calling this every frame with unchanged text is cheap
+
+		:param text: string to render
+		:param color: (r,g,b) color tuple
+		:param scale: multiplier for text size
+		:rvalue image: pygame._sdl2.video.Image holding the rendered text
+		'''
+		key = text, tuple(color) if color else None, scale
+		if key in self._prerendered:
+			self._prerendered.move_to_end(key)
+			return self._prerendered[key]
+
+		renderer = self.texture.renderer
+		size = max(int(self.width(text, scale)), 1), int(self.height * scale)
+		texture = Texture(renderer, size, target=True)
+		texture.blend_mode = 1
+
+		old_target, old_viewport = renderer.target, renderer.get_viewport()
+		old_color, old_blend = renderer.draw_color, self.texture.blend_mode
+		renderer.target = texture
+		renderer.draw_color = (0,0,0,0)
+		renderer.clear()
+		self.texture.blend_mode = 0 # copy glyph alpha instead of blending it
+		self.scale(text, 0, 0, scale, color)
+		self.texture.blend_mode = old_blend
+		renderer.draw_color = old_color
+		renderer.target = old_target
+		renderer.set_viewport(old_viewport)
+
+		image = Image(texture)
+		self._prerendered[key] = image
+		if len(self._prerendered) > 256:
+			self._prerendered.popitem(last=False)
+		return image
 
 	def width(self, text, scale=1):
 		'''
@@ -355,9 +434,23 @@ class TextureFont():
 		:param text: text string to calculate width of
 		:rvalue: width of string in pixels
 		'''
-		w = 0
-		for c in text:
-			w += self.cmap.get(c, self.blank).width * scale
+		return self._text_width(text) * scale
+
+	def _text_width(self, text):
+		'''
+		Return unscaled width of text, remembering recently measured strings
+		'''
+		try:
+			return self._text_widths[text]
+		except KeyError:
+			pass
+		try:
+			w = sum(map(self._widths.__getitem__, text.encode('latin-1')))
+		except UnicodeEncodeError:
+			w = sum(src.width for src in self._glyph_rects(text))
+		if len(self._text_widths) >= 512:
+			self._text_widths.clear()
+		self._text_widths[text] = w
 		return w
 
 
@@ -380,12 +473,13 @@ class NinePatch():
 		if isinstance(source, Texture):
 			self.texture = source
 			area = area or source.get_rect()
-		elif type(source) == Image:
+		elif isinstance(source, Image):
 			self.texture = source.texture
 			area = area or source.srcrect
 
-		elif hasattr(source, '__len__') and type(source[0]) == Renderer:
+		elif hasattr(source, '__len__') and isinstance(source[0], Renderer):
 			self.texture = load_texture(source[0], source[1])
+			area = area or self.texture.get_rect()
 		else:
 			raise ValueError(
 				'Cannot parse {} as source of NinePatch'.format(source))
@@ -395,6 +489,13 @@ class NinePatch():
 		self.min_height = self.top+self.bottom+1
 		self.min_width = self.left+self.right+1
 		self.message = ''
+		self._srcs = tuple(self._quads(self.area))
+		self._parts = tuple(i for i, (x, y, w, h) in enumerate(self._srcs)
+				if w > 0 and h > 0) # skip areas of zero sized borders
+		self._hollow_parts = tuple(i for i in self._parts if i != 4)
+		self._mid = ( # size of the stretched middle of the source area
+				self.area.width-self.left-self.right,
+				self.area.height-self.top-self.bottom)
 
 	def draw(self, dstrect, hollow=False, color=None):
 		'''
@@ -405,72 +506,60 @@ class NinePatch():
 		:rvalue None:
 		'''
 		target = pg.Rect(dstrect)
-
-		target.width = max(target.width, self.min_width)
-		target.height = max(target.height, self.min_height)
-		bounds = self.area
+		x, y = target.topleft
+		w = target.width = max(target.width, self.min_width)
+		h = target.height = max(target.height, self.min_height)
 		texture = self.texture
+		tex_draw = texture.draw
 		if color:
 			texture.color, color = color, texture.color
 
-		texture.draw( # TOP
-			srcrect=(bounds.left, bounds.top, self.left, self.top),
-			dstrect=(target.left, target.top, self.left, self.top) )	
-		texture.draw( # LEFT
-			srcrect=(bounds.left, bounds.top+self.top, self.left,
-					bounds.height-self.top-self.bottom),
-			dstrect=(target.left, target.top+self.top, self.left,
-					target.height-self.top-self.bottom) )
-		texture.draw( # BOTTOM-LEFT
-			srcrect=(bounds.left, bounds.bottom-self.bottom,
-					self.left, self.bottom),
-			dstrect=(target.left, target.bottom-self.bottom,
-					self.left, self.bottom) )	
-
-		texture.draw( # TOP-RIGHT
-			srcrect=(bounds.right-self.right, bounds.top,
-					self.right, self.top),
-			dstrect=(target.right-self.right, target.top,
-					self.right, self.top) )		
-		texture.draw( # RIGHT
-			srcrect=(bounds.right-self.right, bounds.top+self.top,
-					self.right,bounds.height-self.bottom-self.top),
-			dstrect=(target.right-self.right, target.top+self.top,
-					self.right, target.height-self.bottom-self.top) )
-		texture.draw( # BOTTOM-RIGHT
-			srcrect=(bounds.right-self.right, bounds.bottom-self.bottom,
-					self.right, self.bottom),
-			dstrect=(target.right-self.right, target.bottom-self.bottom,
-					self.right, self.bottom) ) 
-		'''
-		texture.draw( # CENTER
-			srcrect=(bounds.left+self.left, bounds.top+self.top,
-					bounds.width-self.right-self.left,
-					bounds.height-self.top-self.bottom),
-			dstrect=(target.left+self.left, target.top+self.top,
-					target.width-self.right-self.left,
-					target.height-self.top-self.bottom) )	'''
-		texture.draw( # TOP
-			srcrect=(bounds.left+self.left, bounds.top,
-					bounds.width-self.left-self.right, self.top),
-			dstrect=(target.left+self.left, target.top,
-					target.width-self.left-self.right, self.top) )
-		texture.draw( # CENTER
-			srcrect=(bounds.left+self.left, bounds.top+self.top,
-					bounds.width-self.right-self.left,
-					bounds.height-self.top-self.bottom),
-			dstrect=(target.left+self.left, target.top+self.top,
-					target.width-self.right-self.left,
-					target.height-self.top-self.bottom) )
-		texture.draw( # BOTTOM
-			srcrect=(bounds.left+self.left, bounds.bottom-self.bottom,
-					bounds.width-self.left-self.right, self.bottom),
-			dstrect=(target.left+self.left, target.bottom-self.bottom,
-					target.width-self.left-self.right, self.bottom) )		
+		area = self.area
+		top, bottom, left, right = self.top, self.bottom, self.left, self.right
+		mid_w, mid_h = self._mid
+		same_w = w == area.width
+		same_h = h == area.height
+		if hollow or not (same_w or same_h):
+			srcs, dsts = self._srcs, self._quads(target)
+			for i in self._hollow_parts if hollow else self._parts:
+				tex_draw(srcrect=srcs[i], dstrect=dsts[i])
+		elif same_w and same_h:
+			# native size, nothing is stretched
+			tex_draw(srcrect=area, dstrect=target)
+		elif same_w:
+			# columns map 1:1 so each row is a single strip
+			sx, sy, ty = area.x, area.y, y
+			for sh, th in ((top, top), (mid_h, h-top-bottom), (bottom, bottom)):
+				if sh > 0 and th > 0:
+					tex_draw(srcrect=(sx, sy, w, sh), dstrect=(x, ty, w, th))
+				sy += sh
+				ty += th
+		else:
+			# rows map 1:1 so each column is a single strip
+			sx, sy, tx = area.x, area.y, x
+			for sw, tw in ((left, left), (mid_w, w-left-right), (right, right)):
+				if sw > 0 and tw > 0:
+					tex_draw(srcrect=(sx, sy, sw, h), dstrect=(tx, y, tw, h))
+				sx += sw
+				tx += tw
 		if color:
 			texture.color = color
 		return target
 
+	def _quads(self, rect):
+		'''
+		Split rect into the nine patch areas using the borders
+
+		:param rect: rect to split
+		:rvalue list: nine (x, y, w, h) tuples ordered left to right and
+			top to bottom
+		'''
+		x, y, w, h = rect
+		left, top, right, bottom = self.left, self.top, self.right, self.bottom
+		columns = (x, left), (x+left, w-left-right), (x+w-right, right)
+		rows = (y, top), (y+top, h-top-bottom), (y+h-bottom, bottom)
+		return [(qx, qy, qw, qh) for qy, qh in rows for qx, qw in columns]
+
 	def get_rect(self):
 		return self.area
 
@@ -491,63 +580,66 @@ class NinePatch():
 		if color:
 			texture.color, color = color, texture.color
 
+		quads = [] # (srcrect, dstrect) pairs drawn together at the end
 		if tsplit < self.left:
-			texture.draw(
-				srcrect=(bounds.left+tsplit, bounds.top,
+			quads.append((
+				(bounds.left+tsplit, bounds.top,
 					self.left - tsplit, self.top),
-				dstrect=(target.left+tsplit, target.top,
-					self.left - tsplit, self.top) )
-			texture.draw(
-				srcrect=(bounds.left+tsplit, bounds.bottom-self.bottom,
+				(target.left+tsplit, target.top,
+					self.left - tsplit, self.top) ))
+			quads.append((
+				(bounds.left+tsplit, bounds.bottom-self.bottom,
 					self.left - tsplit, self.bottom),
-				dstrect=(target.left+tsplit, target.bottom-self.bottom,
-					self.left - tsplit, self.bottom) )
-			texture.draw(
-				srcrect=(bounds.left+tsplit, bounds.top+self.top,
+				(target.left+tsplit, target.bottom-self.bottom,
+					self.left - tsplit, self.bottom) ))
+			quads.append((
+				(bounds.left+tsplit, bounds.top+self.top,
 					self.left - tsplit, bounds.height-self.top-self.bottom),
-				dstrect=(target.left+tsplit, target.top+self.top,
-					self.left - tsplit, target.height-self.top-self.bottom) )
+				(target.left+tsplit, target.top+self.top,
+					self.left - tsplit, target.height-self.top-self.bottom) ))
 
 		if tsplit < target.width - self.right:
 			tstart = max(tsplit, self.left)
 			sstart = max(ssplit, self.left)
-			texture.draw(
-				srcrect=(bounds.left+sstart, bounds.top+self.top,
+			quads.append((
+				(bounds.left+sstart, bounds.top+self.top,
 						bounds.width-self.right-sstart,
 						bounds.height-self.top-self.bottom),
-				dstrect=(target.left+tstart, target.top+self.top,
+				(target.left+tstart, target.top+self.top,
 						target.width-self.right-tstart,
-						target.height-self.top-self.bottom) )
-			texture.draw(
-				srcrect=(bounds.left+sstart, bounds.bottom-self.bottom,
+						target.height-self.top-self.bottom) ))
+			quads.append((
+				(bounds.left+sstart, bounds.bottom-self.bottom,
 						bounds.width-self.right-sstart, self.bottom),
-				dstrect=(target.left+tstart, target.bottom-self.bottom,
-						target.width-self.right-tstart, self.bottom) )		
-
-			texture.draw(
-				srcrect=(bounds.left+sstart, bounds.top,
+				(target.left+tstart, target.bottom-self.bottom,
+						target.width-self.right-tstart, self.bottom) ))
+			quads.append((
+				(bounds.left+sstart, bounds.top,
 						bounds.width-self.right-sstart, self.top),
-				dstrect=(target.left+tstart, target.top,
-						target.width-self.right-tstart, self.top) )
+				(target.left+tstart, target.top,
+						target.width-self.right-tstart, self.top) ))
 
 		tstart = max(target.right-self.right, target.left + tsplit)
 		sstart = max(bounds.right-self.right, bounds.right - (target.width-tsplit))
-		texture.draw(
-			srcrect=(sstart, bounds.top,
+		quads.append((
+			(sstart, bounds.top,
 					bounds.right-sstart, self.top),
-			dstrect=(tstart, target.top,
-					target.right-tstart, self.top) )
-
-		texture.draw(
-			srcrect=(sstart, bounds.top+self.top,
+			(tstart, target.top,
+					target.right-tstart, self.top) ))
+		quads.append((
+			(sstart, bounds.top+self.top,
 					bounds.right-sstart,bounds.height-self.bottom-self.top),
-			dstrect=(tstart, target.top+self.top,
-					target.right-tstart, target.height-self.bottom-self.top) )
-		texture.draw(
-			srcrect=(sstart, bounds.bottom-self.bottom,
+			(tstart, target.top+self.top,
+					target.right-tstart, target.height-self.bottom-self.top) ))
+		quads.append((
+			(sstart, bounds.bottom-self.bottom,
 					bounds.right-sstart, self.bottom),
-			dstrect=(tstart, target.bottom-self.bottom,
-					target.right-tstart, self.bottom) )
+			(tstart, target.bottom-self.bottom,
+					target.right-tstart, self.bottom) ))
+
+		tex_draw = texture.draw
+		for src, dst in quads:
+			tex_draw(srcrect=src, dstrect=dst)
 		if color:
 			texture.color = color
 		return target
@@ -578,15 +670,11 @@ def round_patch2(renderer, radius, color, sizes, colors):
 	layers = list(zip(sizes, colors))
 	full_radius = radius + sum(sizes[:len(layers)])
 	surf = pg.Surface((full_radius*3, full_radius*3), pg.SRCALPHA)
-	c_rad = full_radius
 	
 	r = pg.Rect(0,0,full_radius*3, full_radius*3)
 	for size, _color in layers:
-		print(c_rad)
 		round_rect(surf, _color, r, radius)
 		r.inflate_ip(-size, -size)
-		c_rad -= size
-	print(c_rad)
 	round_rect(surf, color, r, radius)
 	
 	return NinePatch(Texture.from_surface(renderer, surf), (full_radius,)*4)
@@ -606,16 +694,12 @@ def round_patch(renderer, radius, color, sizes, colors):
 	layers = list(zip(sizes, colors))
 	full_radius = radius + sum(sizes[:len(layers)])
 	surf = pg.Surface((full_radius*3, full_radius*3), pg.SRCALPHA)
-	c_rad = full_radius
 	
 	r = pg.Rect(0,0,full_radius*3, full_radius*3)
 	for size, _color in layers:
-		print(c_rad)
 		pg.draw.rect(surf, _color, r,
 			border_radius=radius)
 		r.inflate_ip(-size, -size)
-		c_rad -= size
-	print(c_rad)
 	pg.draw.rect(surf, color, r,
 		border_radius=radius)
 	
@@ -634,23 +718,39 @@ def round_rect(surf, color, rect, rad, thick=0):
 		r = rect.copy()
 		x, r.x = r.x, 0
 		y, r.y = r.y, 0
-		buf = pg.surface.Surface((rect.width, rect.height)).convert()
+		buf = pg.surface.Surface((rect.width, rect.height))
 		buf.set_colorkey(trans)
 		buf.fill(trans)
-		round_rect(buf, r, rad, color, 0)
+		round_rect(buf, color, r, rad, 0)
 		r = r.inflate(-thick*2, -thick*2)
-		round_rect(buf, r, rad, trans, 0)
+		round_rect(buf, trans, r, rad, 0)
 		surf.blit(buf, (x,y))
 
 
 	else:
 		r  = rect.inflate(-rad * 2, -rad * 2)
-		for corn in (r.topleft, r.topright, r.bottomleft, r.bottomright):
-			pg.draw.circle(surf, color, corn, rad)
-			#pg.gfxdraw.filled_circle(surf, *corn, rad, color)
-			#pg.gfxdraw.aacircle(surf, *corn, rad, color)
+		color = pg.Color(color)
+		corners = r.topleft, r.topright, r.bottomleft, r.bottomright
+		if color.a == 255: # opaque corners can be stamped from one circle
+			corner = _corner_surface(rad, tuple(color))
+			offset = corner.get_width() // 2
+			for x, y in corners:
+				surf.blit(corner, (x - offset, y - offset))
+		else:
+			for corn in corners:
+				pg.draw.circle(surf, color, corn, rad)
 
 		pg.draw.rect(surf, color, r.inflate(rad*2, 0))
 		pg.draw.rect(surf, color, r.inflate(0, rad*2))
 
 
+@lru_cache(maxsize=32)
+def _corner_surface(rad, color):
+	'''
+	Return a cached surface holding a filled circle centered on the
+	surface, used to stamp the corners of round_rect
+	'''
+	size = int(rad) * 2 + 2
+	surf = pg.Surface((size, size), pg.SRCALPHA)
+	pg.draw.circle(surf, color, (size // 2, size // 2), rad)
+	return surf
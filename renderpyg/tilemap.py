@@ -23,14 +23,19 @@ License along with renderpyg.
 
 If not, see <http://www.gnu.org/licenses/>.
 '''
+import os
 import pygame as pg
 from functools import partial
+from itertools import compress, groupby, repeat
 from pygame._sdl2 import Window, Renderer, Texture, Image
 from array import array
-from .base import fetch_images, load_images, load_texture
+from collections import OrderedDict
+from .base import fetch_images, load_texture
 import math
 
-buffer = None
+# Let SDL queue copies from the same texture and submit them together.
+# Only read when a Renderer is created, so it must be set before that.
+os.environ.setdefault('SDL_RENDER_BATCHING', '1')
 
 try:
 	import pytmx
@@ -38,102 +43,51 @@ try:
 except ImportError:
 	_PYTMX = False
 
-def scale_tilemap(tilemap, camera=(0,0), scale=1, **kwargs):
+def _render_size(renderer, tilemap=None):
 	'''
-	Draw pytmx or inbuilt tilemap onto pygame GPU renderer
+	Return the size of the current render target, or of the viewport when
+	drawing to the window. Target textures cannot change size, so their
+	size is kept in tilemap._last_rend_size when the tilemap has one
 
-	:param tilemap: pytmx or internal tilemap class
-	:param camera: pg.Vector2 for top left camera location
-	:param scale: float scale value defaults to 1.0
-	:param center: pg.Vector2 to set center camera location
-			True to adjust camera for center
-			Overides camera
-	:param srcrect: area to render in world coordinates overides scale
-			Ignores height to maintain aspect ratio
-	:param dstrect: screen area to render into
-			defaults to entire renderer area
-	:param smooth: for smoother scaling transition but less accurate
-	:param clamp: True to adjust camera to fit world coordinates
-	:rvalue (camx, camy, scale): for adjusting other images
-
-	TODO:
-		impliment smoothing
+	:param renderer: renderer being drawn to
+	:param tilemap: optional tilemap to cache the target size on
+	:rvalue tuple: (width, height)
 	'''
+	target = renderer.target
+	if not target:
+		return renderer.get_viewport().size
+	cached = getattr(tilemap, '_last_rend_size', None)
+	if cached and cached[0] is target:
+		return cached[1]
+	size = target.get_rect().size
+	if cached is not None:
+		tilemap._last_rend_size = target, size
+	return size
 
+def enable_batching(enable=True):
 	'''
-	Setup renderer and viewport
-	'''
-	global buffer
-	renderer = tilemap.images[1].texture.renderer
-	old_viewport = renderer.get_viewport()
-	old_target = renderer.target
-	rend_width, rend_height = renderer.target.get_rect().size if\
-			renderer.target else old_viewport.size
+	Set the SDL render batching hint, which lets SDL combine the many
+	tile copies made by render_tilemap() into fewer GPU draws. It is
+	enabled when renderpyg is imported unless SDL_RENDER_BATCHING is
+	already set, and only takes effect for Renderers created afterwards
 
+	:param enable: False to disable batching for new Renderers
+	:rvalue: None
 	'''
-	Parse options
-	'''
-	smooth = kwargs.get('smooth', False)
-	clamp = kwargs.get('clamp', False)
-	cam_x = int(camera[0])
-	cam_y = int(camera[1])
-	scale = camera[2]
-
-	dstrect = kwargs.get('dstrect', None)
-	try:
-		if dstrect:
-			if not hasattr(dstrect, 'width'):
-				dstrect = pg.Rect(*dstrect)
-			renderer.set_viewport(dstrect)
-			rend_width = dstrect.width
-			rend_height = dstrect.height
-	except Exception:
-		raise ValueError(
-			'render_tilemap() cannot parse "{}" as dest_rect'.format(dstrect))
+	os.environ['SDL_RENDER_BATCHING'] = '1' if enable else '0'
 
-	tile_w = int(tilemap.tilewidth * scale)
-	tile_h = int(tilemap.tileheight * scale)
-	cell_count = len(tilemap.images)
-	cells_wide = rend_width // tile_w + 2
-	cells_high = rend_height // tile_h + 2
-
-	start_cellx, offset_x = divmod(int(cam_x), tile_w)
-	start_celly, offset_y = divmod(int(cam_y), tile_h)	
-
-	layer = tilemap.layers[0].data
-	dest_rect = pg.Rect(-offset_x, -offset_y, tile_w, tile_h) 
-
-	if 'background' in kwargs:
-		tile_background(renderer, kwargs['background'], (cam_x, cam_y), scale)
-	'''
-	Render Tilemap
-	'''
-
-	width = rend_width * scale
-	height = rend_height * scale
-
-	for row in layer[start_celly: start_celly + cells_high]:
-		for frame in row[start_cellx: start_cellx + cells_wide]:
-			if frame > 0:
-				tilemap.images[frame].draw(dstrect=dest_rect)
-			dest_rect.x += tile_w
-		dest_rect.y += tile_h
-		dest_rect.x = -offset_x
-
-
-	return cam_x, cam_y, scale
-
-def tile_background(renderer, background, camera=(0,0), scale=1):
+def tile_background(renderer, background, camera=(0,0), scale=1, cache=None):
 	'''
 	background: image or texture to be tiled across the screen
 	camera: Vector2 representing the top left corner of the screen
 	screensize: Rect representing the size of the buffer we will render to
+	cache: optional dict owned by the caller to keep a texture of the
+		tiled background in between calls
 
 	This function fills the background by tiling a background image across the screen
 	It works similarly to RenderTilemap, except each 'cell' is the same larger background image
 	'''
-	rend_width, rend_height = renderer.target.get_rect().size if\
-			renderer.target else renderer.get_viewport().size
+	rend_width, rend_height = _render_size(renderer)
 	brect = background.get_rect()
 	brect.w *= scale
 	brect.h *= scale
@@ -143,15 +97,80 @@ def tile_background(renderer, background, camera=(0,0), scale=1):
 	ox = -int(px % brect.width)
 	oy = -int(py % brect.height)
 
+	# SDL has no wrapping texture address mode, so draw one texture that
+	# already holds the background tiled across the screen plus one tile
+	cols = -(-rend_width // brect.width) + 1
+	rows = -(-rend_height // brect.height) + 1
+	size = cols * brect.width, rows * brect.height
+	if cache is not None:
+		tiled = _tiled_background(renderer, background, brect, size, cache)
+	else:
+		tiled = None
+	if tiled:
+		tiled.draw(dstrect=(ox, oy, size[0], size[1]))
+		return
+
 	for y in range(oy, rend_height, brect.height):
 	 	for x in range(ox, rend_width, brect.width):
 	 	 	brect.x = x
 	 	 	brect.y = y
 	 	 	background.draw(dstrect=brect)   
 
+def _tiled_background(renderer, background, brect, size, cache):
+	'''
+	Return a target texture of given size filled with the background
+	tiled at brect size, kept in cache until the size or background
+	changes
+
+	:param renderer: renderer being drawn to
+	:param background: image or texture to be tiled
+	:param brect: rect with the scaled size of the background
+	:param size: (width, height) of the texture to fill
+	:param cache: dict holding background: (sizes, texture) for the
+		most recently tiled background
+	:rvalue: Texture or None if target textures are not supported
+	'''
+	key = size, brect.size
+	cached = cache.get(background)
+	if cached and cached[0] == key:
+		return cached[1]
+
+	try:
+		tiled = Texture(renderer, size, target=True)
+	except pg.error:
+		return None
+	cache.clear() # only hold on to the background being drawn
+	cache[background] = key, tiled
+
+	old_target = renderer.target
+	old_viewport = renderer.get_viewport()
+	old_color = renderer.draw_color
+	renderer.target = tiled
+	renderer.draw_color = (0,0,0,0)
+	renderer.clear()
+
+	# Copy without blending so the texture keeps the background's own
+	# alpha, then let the texture blend the way the background would
+	blend_mode = background.blend_mode
+	background.blend_mode = 0
+	dest = pg.Rect(brect)
+	for y in range(0, size[1], brect.height):
+		for x in range(0, size[0], brect.width):
+			dest.x = x
+			dest.y = y
+			background.draw(dstrect=dest)
+	background.blend_mode = blend_mode
+	tiled.blend_mode = blend_mode
+
+	renderer.target = old_target
+	renderer.set_viewport(old_viewport)
+	renderer.draw_color = old_color
+	return tiled
+
 def render_tilemap(tilemap, camera=(0,0,1), scale=1, **kwargs):
 	'''
-	Draw pytmx or inbuilt tilemap onto pygame GPU renderer
+	Draw pytmx or inbuilt tilemap onto pygame GPU renderer. Every tile
+	layer is drawn, bottom layer first
 
 	:param tilemap: pytmx or internal tilemap class
 	:param camera: pg.Vector2 for top left camera location
@@ -165,6 +184,12 @@ def render_tilemap(tilemap, camera=(0,0,1), scale=1, **kwargs):
 			defaults to entire renderer area
 	:param smooth: for smoother scaling transition but less accurate
 	:param clamp: True to adjust camera to fit world coordinates
+	:param cache: True to reuse the visible tiles, tile images and tiled
+			background between calls, call Tilemap.invalidate() after
+			editing any of them
+	:param static: True to draw the layer from a cached target texture
+			that is only redrawn when the camera crosses a tile,
+			implies cache
 	:rvalue (camx, camy, scale): for adjusting other images
 
 	TODO:
@@ -174,18 +199,14 @@ def render_tilemap(tilemap, camera=(0,0,1), scale=1, **kwargs):
 	'''
 	Setup renderer and viewport
 	'''
-	global buffer
 	renderer = tilemap.images[1].texture.renderer
-	old_viewport = renderer.get_viewport()
-	old_target = renderer.target
-	rend_width, rend_height = renderer.target.get_rect().size if\
-			renderer.target else old_viewport.size
+	rend_width, rend_height = _render_size(renderer, tilemap)
 
 	'''
 	Parse options
 	'''
-	smooth = kwargs.get('smooth', False)
 	clamp = kwargs.get('clamp', False)
+	cache = kwargs.get('cache') or kwargs.get('static', False)
 	cam_x = int(camera[0])
 	cam_y = int(camera[1])
 	scale = camera[2]
@@ -235,7 +256,6 @@ def render_tilemap(tilemap, camera=(0,0,1), scale=1, **kwargs):
 	'''
 	Prepare to render the tilemap
 	'''
-	cell_count = len(tilemap.images)
 	tile_w = int(tilemap.tilewidth * scale)
 	tile_h = int(tilemap.tileheight * scale)
 	cells_wide = rend_width // tile_w + 2
@@ -248,28 +268,26 @@ def render_tilemap(tilemap, camera=(0,0,1), scale=1, **kwargs):
 	start_cellx, offset_x = divmod(int(cam_x), tile_w)
 	start_celly, offset_y = divmod(int(cam_y), tile_h)	
 
-	if start_cellx < 0: # Handle negative values
-		offset_x += start_cellx * tile_w
-		start_cellx = 0
-	if start_celly < 0:
-		offset_y += start_celly * tile_h
-		start_celly = 0
-
-	dest_rect = pg.Rect(-offset_x, -offset_y, tile_w, tile_h) 
-	layer = tilemap.layers[0].data
+	# Handle negative values, the view starts on the first cell instead
+	offset_x += min(start_cellx, 0) * tile_w
+	offset_y += min(start_celly, 0) * tile_h
+	start_cellx = max(start_cellx, 0)
+	start_celly = max(start_celly, 0)
 
 	if 'background' in kwargs:
-		tile_background(renderer, kwargs['background'], (cam_x, cam_y), scale)
+		tile_background(renderer, kwargs['background'], (cam_x, cam_y), scale,
+				getattr(tilemap, '_backgrounds', None) if cache else None)
 	'''
 	Render Tilemap
 	'''
-	for row in layer[start_celly: start_celly + cells_high]:
-		for frame in row[start_cellx: start_cellx + cells_wide]:
-			if frame > 0:
-				tilemap.images[frame].draw(dstrect=dest_rect)
-			dest_rect.x += tile_w
-		dest_rect.y += tile_h
-		dest_rect.x = -offset_x
+	key = start_cellx, start_celly, cells_wide, cells_high, tile_w, tile_h
+	static = kwargs.get('static') and hasattr(tilemap, '_static_targets')
+	for index, layer in _tile_layers(tilemap):
+		if static:
+			_draw_static(tilemap, renderer, layer, index, key, offset_x, offset_y)
+		else:
+			_draw_tiles(tilemap, _visible_tiles(tilemap, layer, key, index, cache),
+					-offset_x, -offset_y, tile_w, tile_h, cache=cache)
 
 	#camera[0] = cam_x
 	#camera[1] = cam_y
@@ -281,7 +299,237 @@ def render_tilemap(tilemap, camera=(0,0,1), scale=1, **kwargs):
 	return cam_x, cam_y, scale
 	
 
-def pgvideo_image_loader(renderer, filename, colorkey, **kwargs):
+def _tile_layers(tilemap):
+	'''
+	Return (index, data) for each tile layer to draw, bottom first. Only
+	visible tile layers are used for pytmx maps
+
+	:param tilemap: pytmx or internal tilemap class
+	:rvalue list: (index, layer data) tuples
+	'''
+	layers = tilemap.layers
+	if hasattr(tilemap, 'visible_tile_layers'):
+		return [(i, layers[i].data) for i in tilemap.visible_tile_layers]
+	return [(i, layer.data) for i, layer in enumerate(layers)]
+
+def _visible_tiles(tilemap, layer, key, index=0, cache=False):
+	'''
+	Return a list of (frame, x, y) tuples for the non empty cells in
+	view, with positions relative to the first visible cell. With cache
+	set, results are kept in tilemap._visible_cache when the tilemap has
+	one, so the layer is only sliced again once the camera crosses a
+	tile. Tiles are grouped by texture when the tileset uses several
+
+	:param tilemap: pytmx or internal tilemap class
+	:param layer: layer data as a list of rows
+	:param key: (start_cellx, start_celly, cells_wide, cells_high,
+		tile_w, tile_h) tuple describing the view
+	:param index: index of the layer in tilemap.layers
+	:param cache: True to reuse results and the _tile_sources() table
+		until Tilemap.invalidate() is called
+	:rvalue list: (frame, x, y) tuples
+	'''
+	visible = getattr(tilemap, '_visible_cache', None) if cache else None
+	cache_key = index, key
+	if visible is not None and cache_key in visible:
+		visible.move_to_end(cache_key)
+		return visible[cache_key]
+
+	start_cellx, start_celly, cells_wide, cells_high, tile_w, tile_h = key
+	end_cellx = start_cellx + cells_wide
+	xs = range(0, cells_wide * tile_w, tile_w)
+	tiles = []
+	y = 0
+	for row in layer[start_celly: start_celly + cells_high]:
+		cells = row[start_cellx: end_cellx]
+		# zip/compress build the triples for occupied cells without a
+		# Python level loop, empty rows are passed over entirely
+		if any(cells):
+			tiles.extend(zip(compress(cells, cells), compress(xs, cells), repeat(y)))
+		y += tile_h
+
+	# Keep tiles from the same texture together so SDL can batch them,
+	# cells in a layer never overlap so the draw order does not matter
+	sources = _tile_sources(tilemap) if cache else None
+	if sources:
+		textures = [id(sources[0][frame]) for frame, x, y in tiles]
+	else:
+		images = tilemap.images
+		textures = [id(images[frame].texture) for frame, x, y in tiles]
+	if len(set(textures)) > 1:
+		order = sorted(range(len(tiles)), key=textures.__getitem__)
+		tiles = [tiles[i] for i in order]
+
+	if visible is not None:
+		visible[cache_key] = tiles
+		if len(visible) > 16 * len(tilemap.layers):
+			visible.popitem(last=False)
+	return tiles
+
+def _tile_sources(tilemap):
+	'''
+	Return (textures, srcrects, firsts) when every tile image is a plain
+	view of a texture and shares color, alpha and blend mode with the
+	other images on that texture, so tiles can be copied with
+	Texture.draw instead of Image.draw, which resets the texture state
+	on every call. textures and srcrects are indexed by tile number and
+	firsts maps each texture to the image holding its state. The result
+	is kept in tilemap._tile_sources when the tilemap has one
+
+	:param tilemap: pytmx or internal tilemap class
+	:rvalue: (textures, srcrects, firsts) tuple or None
+	'''
+	sources = getattr(tilemap, '_tile_sources', False)
+	if sources is False or sources:
+		return sources or None
+
+	firsts = {}
+	for image in tilemap.images:
+		if image is None:
+			continue
+		first = firsts.setdefault(getattr(image, 'texture', None), image)
+		if not (isinstance(image, Image) and
+				image.angle == 0 and
+				not image.flip_x and not image.flip_y and
+				image.color == first.color and
+				image.alpha == first.alpha and
+				image.blend_mode == first.blend_mode):
+			tilemap._tile_sources = False
+			return None
+	if not firsts:
+		return None
+	tilemap._tile_sources = sources = (
+		[image.texture if image else None for image in tilemap.images],
+		[image.srcrect if image else None for image in tilemap.images],
+		firsts)
+	return sources
+
+def _draw_tiles(
+		tilemap, tiles, x, y, tile_w, tile_h, blend_mode=None, cache=False):
+	'''
+	Draw (frame, x, y) tiles from _visible_tiles() offset by x and y. With
+	cache set, tiles are copied from the srcrect table of _tile_sources()
+	when possible
+
+	:param tilemap: pytmx or internal tilemap class
+	:param tiles: list of (frame, x, y) tuples grouped by texture
+	:param x: added to the x position of each tile
+	:param y: added to the y position of each tile
+	:param tile_w: width to draw each tile
+	:param tile_h: height to draw each tile
+	:param blend_mode: draw with this blend mode instead of the images'
+	:param cache: True to use the table kept by _tile_sources()
+	:rvalue: None
+	'''
+	dest_rect = pg.Rect(0, 0, tile_w, tile_h)
+	sources = _tile_sources(tilemap) if cache else None
+	if sources: # copy straight from the textures, one pass for each
+		textures, srcs, firsts = sources
+		if len(firsts) == 1:
+			groups = (next(iter(firsts)), tiles),
+		else: # tiles are already grouped by texture
+			groups = groupby(tiles, lambda tile: textures[tile[0]])
+		if blend_mode is not None: # keep the modes Image.draw would use
+			modes = [(texture, texture.blend_mode) for texture in firsts]
+		for texture, group in groups:
+			first = firsts[texture]
+			texture.color = first.color
+			texture.alpha = first.alpha
+			texture.blend_mode = first.blend_mode if blend_mode is None else blend_mode
+			tex_draw = texture.draw
+			for frame, tx, ty in group:
+				dest_rect.x = tx + x
+				dest_rect.y = ty + y
+				tex_draw(srcrect=srcs[frame], dstrect=dest_rect)
+		if blend_mode is not None:
+			for texture, mode in modes:
+				texture.blend_mode = mode
+		return
+
+	images = tilemap.images
+	if blend_mode is not None: # Image.draw applies the image's own mode
+		drawn = {images[frame] for frame, tx, ty in tiles}
+		modes = [(image, image.blend_mode) for image in drawn]
+		for image in drawn:
+			image.blend_mode = blend_mode
+	draw = Image.draw
+	for frame, tx, ty in tiles:
+		dest_rect.x = tx + x
+		dest_rect.y = ty + y
+		draw(images[frame], dstrect=dest_rect)
+	if blend_mode is not None:
+		for image, mode in modes:
+			image.blend_mode = mode
+
+def _draw_static(tilemap, renderer, layer, index, key, offset_x, offset_y):
+	'''
+	Draw the visible cells of a layer from a target texture holding the
+	whole view, which is only updated when the camera crosses a tile or
+	the view changes size. Each layer has a pair of target textures so
+	a scrolled view can be copied from the previous one, leaving only
+	the newly exposed cells to draw
+
+	:param tilemap: internal Tilemap object
+	:param renderer: renderer being drawn to
+	:param layer: layer data as a list of rows
+	:param index: index of the layer in tilemap.layers
+	:param key: view tuple as used by _visible_tiles()
+	:param offset_x: sub tile camera offset on the x axis
+	:param offset_y: sub tile camera offset on the y axis
+	:rvalue: None
+	'''
+	cells_wide, cells_high, tile_w, tile_h = key[2:]
+	size = cells_wide * tile_w, cells_high * tile_h
+	static = tilemap._static_targets.get(index)
+	if not static or static[0].get_rect().size != size:
+		target = Texture(renderer, size, target=True)
+		target.blend_mode = 1
+		static = tilemap._static_targets[index] = [target, None, None]
+	target, last_key, spare = static
+
+	if last_key != key:
+		tiles = _visible_tiles(tilemap, layer, key, index, cache=True)
+		if last_key and last_key[2:] == key[2:]:
+			dx = key[0] - last_key[0]
+			dy = key[1] - last_key[1]
+		else:
+			dx = dy = cells_wide + cells_high # nothing can be reused
+		scroll = abs(dx) < cells_wide and abs(dy) < cells_high
+
+		old_target = renderer.target
+		old_viewport = renderer.get_viewport()
+		old_color = renderer.draw_color
+		if scroll:
+			if not spare:
+				spare = Texture(renderer, size, target=True)
+				spare.blend_mode = 1
+			renderer.target = spare
+		else:
+			renderer.target = target
+		renderer.draw_color = (0,0,0,0)
+		renderer.clear()
+
+		# Copy without blending to keep the alpha exact for when the
+		# target is blended later, tiles never overlap so this is safe
+		if scroll:
+			mode, target.blend_mode = target.blend_mode, 0
+			target.draw(dstrect=(-dx * tile_w, -dy * tile_h, size[0], size[1]))
+			target.blend_mode = mode
+			keep_x = range(max(0, -dx) * tile_w, min(cells_wide, cells_wide - dx) * tile_w)
+			keep_y = range(max(0, -dy) * tile_h, min(cells_high, cells_high - dy) * tile_h)
+			tiles = [tile for tile in tiles
+					if tile[1] not in keep_x or tile[2] not in keep_y]
+			target, spare = spare, target
+		_draw_tiles(tilemap, tiles, 0, 0, tile_w, tile_h, blend_mode=0, cache=True)
+
+		renderer.target = old_target
+		renderer.set_viewport(old_viewport)
+		renderer.draw_color = old_color
+		static[:] = target, key, spare
+
+	target.draw(dstrect=(-offset_x, -offset_y, size[0], size[1]))
+
+def pgvideo_image_loader(renderer, filename, colorkey, textures=None, **kwargs):
 	'''
 	Loads an image file into a Texture and holds a reference to it
 	Returns a generator function that creates Images based on the
@@ -290,6 +538,8 @@ def pgvideo_image_loader(renderer, filename, colorkey, **kwargs):
 	:param renderer: active video.Renderer
 	:param filename: path to Tiled tmx tilemap file
 	:param colorkey: unused surface colorkey unused in GPU rendering
+	:param textures: dict of textures already loaded for this map, so
+		tilesets sharing an image file also share one texture
 	:rvalue: generator function
 	'''
 	from pygame._sdl2 import video
@@ -303,24 +553,34 @@ def pgvideo_image_loader(renderer, filename, colorkey, **kwargs):
 		del surface
 		return texture_
 
-	def load_image(rect=None, flags=None):
+	def make_image(rect, flags):
 		if rect:
-				rect = pg.Rect(*rect)
-				image = video.Image(texture)
-				image.srcrect = rect
+				image = video.Image(texture, srcrect=rect)
 				
 				if flags.flipped_horizontally:
-					image.flipX = True
+					image.flip_x = True
 				elif flags.flipped_vertically:
-					image.flipY = True
+					image.flip_y = True
 				elif flags.flipped_diagonally:
-					image.flipX = True
-					image.flipY = True
+					image.flip_x = True
+					image.flip_y = True
 				return image
 		else:
 			return video.Image(texture)
 
-	texture = convert(pg.image.load(filename))
+	images = {} # (rect, flags): image, tiles repeat across a map
+	def load_image(rect=None, flags=None):
+		key = tuple(rect) if rect else None, flags
+		image = images.get(key)
+		if image is None:
+			image = images[key] = make_image(rect, flags)
+		return image
+
+	if textures is None:
+		textures = {}
+	texture = textures.get(filename)
+	if not texture:
+		texture = textures[filename] = convert(pg.image.load(filename))
 	return load_image
 
 def load_tmx(renderer, filename, *args, **kwargs):
@@ -332,7 +592,8 @@ def load_tmx(renderer, filename, *args, **kwargs):
 	:param filename: path to Tiled tmx tilemap file
 	:rvalue pytmx.TiledMap
 	'''
-	kwargs['image_loader'] = partial(pgvideo_image_loader, renderer)
+	kwargs['image_loader'] = partial(
+			pgvideo_image_loader, renderer, textures={})
 	tilemap = pytmx.TiledMap(filename, *args, **kwargs)
 	print('tilemap loaded from {}\n\tSIZE: map={}, tile={}, world={}'.format(
 			filename, (tilemap.width, tilemap.height),
@@ -343,12 +604,14 @@ def load_tmx(renderer, filename, *args, **kwargs):
 
 
 def load_tilemap_string(
-		data, delimit=',', line_break='\n', default=0, fill=True):
+		data, delimit=',', line_break='\n', default=0, fill=True,
+		compact=False):
 	'''
 	Load data from a string into a tilemap. A tilemap is a python list
 	of arrays with unsigned int values. Tilemap data can be accessed as
 	tilemap[y_cell][x_cell] where x_cell < width, y_cell < height, and
-	the highest value is returned as highest_value.
+	the highest value is returned as highest_value. Rows hold 16 bit
+	values, or 8 bit values with compact set when every value fits.
 
 	:param data: a single python string of int values for each cell in map
 	:param delimit: delimiter separating int values, def = ','
@@ -356,6 +619,8 @@ def load_tilemap_string(
 	:param default: value to replace invalid or missing cell values
 	:param fill: fill short rows with default if true(def),
 			else trim lines to shortest
+	:param compact: use 8 bit rows when every value fits, halving their
+			size, but values above 255 can not be stored later
 	:rvalue: tilemap, (width, height, highest_value)
 	'''
 	tilemap = []
@@ -367,17 +632,27 @@ def load_tilemap_string(
 		row = line.strip(' ,').split(delimit)
 		longest_row = max(longest_row, len(row))
 		shortest_row = min(shortest_row, len(row))
-		data = []
-		for item in row:
-			try:
-				highest_value = max(highest_value, int(item))
-				data.append(max(0, int(item)))
-			except:
-				data.append(default)
+		try: # parse the whole row at once, most rows are valid
+			data = list(map(int, row))
+			highest_value = max(highest_value, max(data))
+			if min(data) < 0:
+				data = [max(0, item) for item in data]
+		except ValueError:
+			data = []
+			for item in row:
+				try:
+					highest_value = max(highest_value, int(item))
+					data.append(max(0, int(item)))
+				except:
+					data.append(default)
 		rows.append(data)
 	width = longest_row if fill else shortest_row
-	for row in rows:
-		tilemap.append(array('H', row[:width]))
+	typecode = 'B' if compact and max(highest_value, default) < 256 else 'H'
+	for row in rows: # every row is exactly width cells
+		row = array(typecode, row if len(row) <= width else row[:width])
+		if len(row) < width:
+			row.extend(array(typecode, [default]) * (width - len(row)))
+		tilemap.append(row)
 
 	print('tilemap loaded from string\n\tSIZE: map={}'.format(
 			(width, len(tilemap)) ))
@@ -403,11 +678,10 @@ def load_tileset(
  	:param texture: fetch images from this texture instead of filename
  	:rvalue: list of pygame._sdl2.video.Image objects
 	'''
-	if texture:
-		fetch_images(texture, width, height, spacing, margin, by_count)
-	else:
-		return load_images(
-			renderer, filename, width, height, spacing, margin, by_count)
+	if not texture:
+		texture = load_texture(renderer, filename)
+		texture.blend_mode = 1
+	return fetch_images(texture, width, height, spacing, margin, by_count)
 
 
 class Tilemap:
@@ -425,6 +699,11 @@ class Tilemap:
 		'''
 		self.layers = []
 		self.images = []
+		self._visible_cache = OrderedDict()
+		self._static_targets = {} # layer index: [target, view key, spare target]
+		self._backgrounds = {} # background: (sizes, tiled target texture)
+		self._tile_sources = None
+		self._last_rend_size = ()
 		self.width = 0
 		self.height = 0
 		self.tilewidth = 0
@@ -453,6 +732,22 @@ class Tilemap:
 		'''
 		if self.verify_tilemap(_map):
 			self.layers.append(self.Layer(_map))
+			self.invalidate()
+
+	def invalidate(self):
+		'''
+		Discard the visible tiles and tile images cached by
+		render_tilemap() with cache or static set, and the tiled
+		background. Call this after changing layer data, tile images
+		or the background directly
+
+		:rvalue: None
+		'''
+		self._visible_cache.clear()
+		for static in self._static_targets.values():
+			static[1] = None
+		self._tile_sources = None
+		self._backgrounds.clear()
 
 	def clean_tilemap(self, layer, default=0):
 		'''
@@ -470,9 +765,12 @@ class Tilemap:
 			default = 0
 
 		for row in data:
+			if not row or 0 <= min(row) and max(row) < tile_count:
+				continue # min/max scan the row in C, most rows are valid
 			for x, cell in enumerate(row):
 				if cell < 0 or cell > tile_count-1:
 					row[x] = default
+		self.invalidate()
 
 	def update_tileset(self, replacement):
 		'''
@@ -484,6 +782,7 @@ class Tilemap:
 		if type(replacement) == Texture:
 			for image in self.images:
 				image.texture = replacement
+			self.invalidate()
 		else:
 			try:
 				tiles = len(replacement)
@@ -493,6 +792,7 @@ class Tilemap:
 					'as texture or tileset'.format(replacement))	
 			if self.highest_value < tiles:
 				self.images = replacement
+				self.invalidate()
 			else:
 				print('tileset too small for current tilemap: ignoring update')
 
@@ -506,6 +806,7 @@ class Tilemap:
 		'''
 		if self.verify_tilemap(_map) and layer < len(self.layers):
 			self.layers[layer] = self.Layer(_map)
+			self.invalidate()
 
 	def verify_tilemap(self, _map):
 		'''
@@ -532,6 +833,8 @@ class Tilemap:
 		'''
 		Simple class used to maintain layout used by pytmx module
 		'''
+		__slots__ = ('data', 'width', 'height', 'highest_value')
+
 		def __init__(self, _map):
 			tile_data, info = _map
 			width, height, highest = info